@@ -1,15 +1,124 @@
+import os
 import json
 import datetime
 import hashlib
+import struct
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.sharedctypes import Synchronized
+from multiprocessing.synchronize import Event
 from data_types import BlockType, TransactionType
 
 
 BLOCK_REWARD = 50.0  # TOY
+NONCE_BATCH = 1 << 12  # nonces scanned per _find_nonce call
 
+# PoW: block hash, read as a 256-bit big-endian integer, must be below TARGET.
+TARGET_BITS = 16
+TARGET = 1 << (256 - TARGET_BITS)
+_TARGET_BYTES = TARGET.to_bytes(32, "big")  # same order as TARGET for 32-byte digests
 
-def _hash_dict(obj: dict | BlockType | TransactionType) -> str:
+# Binary block header: index, timestamp digest, previous hash, Merkle root, nonce.
+# Nonce goes last, so mining can hash everything before it once and reuse the midstate.
+HEADER = struct.Struct("<I32s32s32sQ")
+NONCE_SIZE = 8
+
+# What hashing a malformed block received from a peer may raise.
+_MALFORMED_BLOCK_ERRORS = (ValueError, KeyError, TypeError, AttributeError, struct.error)
+
+# hashlib dispatches to OpenSSL (which picks SHA-NI/AVX2 code paths itself) when it's linked in.
+SHA256_BACKEND = "openssl" if hashlib.sha256.__name__.startswith("openssl") else "builtin"
+
+# json.dumps(..., sort_keys=True) builds a new encoder on every call; reusing one halves the cost.
+_canonical_json = json.JSONEncoder(sort_keys=True).encode
+
+
+def _hash_dict(obj: dict | BlockType | TransactionType) -> bytes:
     """Hashes dict object."""
-    return hashlib.sha256(json.dumps(obj, sort_keys=True).encode()).hexdigest()
+    return hashlib.sha256(_canonical_json(obj).encode()).digest()
+
+
+def _merkle_root(leaves: list[bytes]) -> bytes:
+    """
+    Computes Merkle root over leaf hashes: each level hashes adjacent pairs (last one is paired
+    with itself on odd levels). No leaves give 32 zero bytes.
+    """
+    level = list(leaves)
+    if not level:
+        return bytes(32)
+
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [hashlib.sha256(level[i] + level[i + 1]).digest() for i in range(0, len(level), 2)]
+
+    return level[0]
+
+
+def merkle_root(txs: list[TransactionType]) -> bytes:
+    """Computes Merkle root of transactions."""
+    return _merkle_root([_hash_dict(tx) for tx in txs])
+
+
+def pack_block(block: BlockType, tx_root: bytes | None = None) -> bytes:
+    """
+    Packs block into its fixed-size binary header - that's what gets hashed.
+
+    Transactions are committed to through their Merkle root, so header size (and hashing cost)
+    doesn't depend on how many transactions the block carries. Pass `tx_root` if it's already known.
+    """
+    return HEADER.pack(
+        block["index"],
+        hashlib.sha256(block["timestamp"].encode()).digest(),  # exact string, not just the instant
+        bytes.fromhex(block["previous_hash"].rjust(64, "0")),
+        merkle_root(block["transactions"]) if tx_root is None else tx_root,
+        block["nonce"],
+    )
+
+
+def _find_nonce(prefix: bytes, start: int, end: int) -> int | None:
+    """
+    Scans nonces in [start, end) and returns the first one giving a valid PoW hash, or None.
+
+    Only the nonce changes between attempts, so the prefix is hashed once and its midstate is
+    reused. Everything the loop touches is bound to a local to keep per-attempt overhead minimal.
+    """
+    copy = hashlib.sha256(prefix).copy
+    for nonce in range(start, end):
+        h = copy()
+        h.update(nonce.to_bytes(NONCE_SIZE, "little"))
+        if h.digest() < _TARGET_BYTES:
+            return nonce
+
+    return None
+
+
+# Set in every mining worker process by _init_miner.
+_next_nonce: Synchronized | None = None
+_nonce_found: Event | None = None
+
+
+def _init_miner(next_nonce: Synchronized, nonce_found: Event) -> None:
+    """Mining worker process initializer: keeps the shared nonce counter and stop flag."""
+    global _next_nonce, _nonce_found
+    _next_nonce, _nonce_found = next_nonce, nonce_found
+
+
+def _mine_worker(prefix: bytes) -> int | None:
+    """
+    Mining worker: claims NONCE_BATCH-sized batches from the shared counter until it finds a valid
+    nonce, or until another worker does (the stop flag is checked between batches).
+    """
+    while not _nonce_found.is_set():
+        with _next_nonce.get_lock():
+            start = _next_nonce.value
+            _next_nonce.value = start + NONCE_BATCH
+
+        if (nonce := _find_nonce(prefix, start, start + NONCE_BATCH)) is not None:
+            _nonce_found.set()
+            return nonce
+
+    return None
 
 
 # Initial block - GENESIS.
@@ -28,24 +137,74 @@ class Blockchain:
     PoW, a mempool, and longest-valid-chain replacement.
     """
 
-    def __init__(self):
+    def __init__(self, workers: int | None = None):
         self.chain: list[BlockType] = [GENESIS]
+        self.hashes: list[str] = [self.hash_block(GENESIS)]  # kept in lock-step with self.chain
         self.mempool: dict[str, TransactionType] = {}
+        self.tx_leaves: dict[str, bytes] = {}  # tx_id -> Merkle leaf hash, for every mempool tx
+        self.confirmed_ids: set[str] = set()  # ids of regular txs confirmed in self.chain
+        self.workers = workers or os.cpu_count() or 1
+        self._pool: ProcessPoolExecutor | None = None
+        self._next_nonce: Synchronized | None = None  # shared with mining workers, see _mine_worker
+        self._nonce_found: Event | None = None
 
     def hash_block(self, block: BlockType) -> str:
         """Hashes block."""
-        return _hash_dict(block)
+        return hashlib.sha256(pack_block(block)).hexdigest()
 
-    def _build_block(self, nonce: int, previous_hash: str, txs: list[TransactionType]) -> BlockType:
+    def _hash_peer_block(self, block: BlockType) -> str | None:
+        """Hashes block that came from a peer. Returns None if it's malformed and can't be hashed."""
+        try:
+            return self.hash_block(block)
+        except _MALFORMED_BLOCK_ERRORS:
+            return None
+
+    def _build_block(self, nonce: int, previous_hash: str, txs: list[TransactionType], timestamp: str) -> BlockType:
         """Builds a single block resource."""
         return {
             "index": len(self.chain) + 1,
-            "timestamp": datetime.datetime.now().isoformat(),
+            "timestamp": timestamp,
             "nonce": nonce,
             "previous_hash": previous_hash,
             "transactions": txs,
         }
 
+    def _search_nonce(self, prefix: bytes, start: int) -> int:
+        """
+        Searches for a valid nonce, starting from `start`.
+
+        Nonce search is embarrassingly parallel: every worker process claims disjoint batches from
+        a shared counter, and the first one to find a valid nonce stops the others.
+        """
+        if self.workers == 1:
+            while (nonce := _find_nonce(prefix, start, start + NONCE_BATCH)) is None:
+                start += NONCE_BATCH
+            return nonce
+
+        if self._pool is None:
+            # Node mines while its listener thread is running - forking a threaded process isn't safe.
+            ctx = multiprocessing.get_context("spawn")
+            self._next_nonce = ctx.Value("Q", start)
+            self._nonce_found = ctx.Event()
+            self._pool = ProcessPoolExecutor(
+                self.workers,
+                mp_context=ctx,
+                initializer=_init_miner,
+                initargs=(self._next_nonce, self._nonce_found),
+            )
+
+        self._next_nonce.value = start
+        self._nonce_found.clear()
+        futures = [self._pool.submit(_mine_worker, prefix) for _ in range(self.workers)]
+        return min(nonce for f in futures if (nonce := f.result()) is not None)
+
+    def mining_backend(self) -> str:
+        """Describes how nonce search runs on this host, e.g. 'openssl sha256, 8 processes'."""
+        if self.workers == 1:
+            return f"{SHA256_BACKEND} sha256, inline"
+
+        return f"{SHA256_BACKEND} sha256, {self.workers} processes"
+
     def get_latest_block(self) -> BlockType:
         """Gets latest block from chain."""
         return self.chain[-1]
@@ -56,7 +215,7 @@ class Blockchain:
 
         btw, this method is responsible for building a new valid block and updating chain with it.
         """
-        prev_hash = self.hash_block(self.get_latest_block())
+        prev_hash = self.hashes[-1]
 
         coinbase_tx: TransactionType = {
             "tx_id": f"coinbase-{len(self.chain)+1}",
@@ -67,52 +226,95 @@ class Blockchain:
         }
 
         txs = [coinbase_tx] + list(self.mempool.values())
+        tx_root = _merkle_root([_hash_dict(coinbase_tx)] + [self.tx_leaves[tid] for tid in self.mempool])
 
-        block = self._build_block(nonce=1, previous_hash=prev_hash, txs=txs)
-        while not self.hash_block(block).startswith("0000"):
-            block["nonce"] += 1
+        # Timestamp is captured once and baked into the packed prefix - the nonce loop never reads the clock.
+        timestamp = datetime.datetime.now().isoformat()
+        block = self._build_block(nonce=1, previous_hash=prev_hash, txs=txs, timestamp=timestamp)
+        prefix = pack_block(block, tx_root=tx_root)[:-NONCE_SIZE]
+        block["nonce"] = self._search_nonce(prefix, start=block["nonce"])
 
         self.chain.append(block)
+        # Header is the mined prefix plus the nonce - no need to recompute the Merkle root.
+        self.hashes.append(hashlib.sha256(prefix + block["nonce"].to_bytes(NONCE_SIZE, "little")).hexdigest())
         self._remove_confirmed_from_mempool(block["transactions"])
         return block
 
-    def is_chain_valid(self, chain: list[BlockType] | None = None) -> bool:
-        """Validates full chain object."""
+    @staticmethod
+    def _txs_unique(txs: list[TransactionType], confirmed_ids: set[str]) -> bool:
+        """
+        Checks that no tx_id repeats within the block and no regular tx is already confirmed.
 
-        chain = chain or self.chain
+        The last leaf of an odd Merkle level is paired with itself, so appending a copy of the
+        last tx keeps the Merkle root (Bitcoin's CVE-2012-2459) - repeated ids must be rejected.
+        """
+        try:
+            ids = [tx["tx_id"] for tx in txs]
+            regular_ids = [tx["tx_id"] for tx in txs if tx["type"] == "regular"]
+            return len(set(ids)) == len(ids) and confirmed_ids.isdisjoint(regular_ids)
+        except _MALFORMED_BLOCK_ERRORS:
+            return False
+
+    @classmethod
+    def _links_valid(cls, chain: list[BlockType], hashes: list[str]) -> bool:
+        """Checks genesis, PoW, previous-hash linkage and tx uniqueness of a chain, given its blocks' hashes."""
         if not chain or chain[0] != GENESIS:
             return False
 
-        for i in range(1, len(chain)):
-            prev, curr = chain[i-1], chain[i]
-            if not _hash_dict(curr).startswith("0000") or curr["previous_hash"] != _hash_dict(prev):
+        confirmed_ids: set[str] = set()
+        for prev_hash, curr, curr_hash in zip(hashes, chain[1:], hashes[1:]):
+            if int(curr_hash, 16) >= TARGET or curr["previous_hash"] != prev_hash:
+                return False
+
+            if not cls._txs_unique(curr["transactions"], confirmed_ids):
                 return False
+            confirmed_ids.update(tx["tx_id"] for tx in curr["transactions"] if tx["type"] == "regular")
 
         return True
 
+    def is_chain_valid(self, chain: list[BlockType] | None = None) -> bool:
+        """Validates full chain object. Own chain is checked against cached hashes - no re-hashing."""
+        if not chain:
+            return self._links_valid(self.chain, self.hashes)
+
+        hashes = [self._hash_peer_block(b) for b in chain]
+        return None not in hashes and self._links_valid(chain, hashes)
+
     def validate_and_add_block(self, block: BlockType) -> bool:
         """Validates a single block resource, adds to chain if it's valid."""
-        last = self.get_latest_block()
-        if not self.hash_block(block).startswith("0000") or block["previous_hash"] != self.hash_block(last):
+        block_hash = self._hash_peer_block(block)
+        if block_hash is None or int(block_hash, 16) >= TARGET or block["previous_hash"] != self.hashes[-1]:
+            return False
+
+        if not self._txs_unique(block["transactions"], self.confirmed_ids):
             return False
 
         self.chain.append(block)
+        self.hashes.append(block_hash)
         self._remove_confirmed_from_mempool(block["transactions"])
         return True
 
     def replace_chain(self, new_chain: list[BlockType]) -> bool:
         """Replaces full chain."""
-        if not self.is_chain_valid(new_chain) or len(new_chain) <= len(self.chain):
+        if len(new_chain) <= len(self.chain):
+            return False
+
+        new_hashes = [self._hash_peer_block(b) for b in new_chain]
+        if None in new_hashes or not self._links_valid(new_chain, new_hashes):
             return False
 
+        # Both chains share blocks up to the fork point, only the diverging suffixes change confirmed ids.
+        common_len = 0
+        for old_hash, new_hash in zip(self.hashes, new_hashes):
+            if old_hash != new_hash:
+                break
+            common_len += 1
+
+        dropped_txs = [tx for blk in self.chain[common_len:] for tx in blk["transactions"]]
         self.chain = [b for b in new_chain]
-        confirmed_ids = {
-            tx["tx_id"]
-            for blk in self.chain
-            for tx in blk["transactions"]
-            if tx["type"] == "regular"
-        }
-        self.mempool = {tid: tx for tid, tx in self.mempool.items() if tid not in confirmed_ids}
+        self.hashes = new_hashes
+        self.confirmed_ids -= {tx["tx_id"] for tx in dropped_txs if tx["type"] == "regular"}
+        self._remove_confirmed_from_mempool([tx for blk in self.chain[common_len:] for tx in blk["transactions"]])
         return True
 
     def add_transaction(self, tx: TransactionType) -> tuple[bool, TransactionType]:
@@ -134,7 +336,7 @@ class Blockchain:
         if amt <= 0:
             return False, tx
 
-        if not tx.get("sender") or not tx.get("receiver") or not tx.get("tx_id"):
+        if not all(isinstance(tx.get(key), str) and tx[key] for key in ("sender", "receiver", "tx_id")):
             return False, tx
 
         if tx.get("type") not in ("regular", "coinbase"):
@@ -144,15 +346,24 @@ class Blockchain:
         if tx_id in self.mempool:
             return False, self.mempool[tx_id]
 
+        if tx_id in self.confirmed_ids:
+            return False, tx
+
         if tx["type"] == "coinbase":
             return False, tx
 
+        # Amount is stored as float whatever type it arrived as, so blocks commit to the same value
+        # peers decode from the binary wire format.
+        tx = {**tx, "amount": amt}
         self.mempool[tx_id] = tx
+        self.tx_leaves[tx_id] = _hash_dict(tx)
         return True, tx
 
     def _remove_confirmed_from_mempool(self, confirmed_txs: list[TransactionType]) -> None:
-        """Removes confirmed transactions from mempool."""
+        """Removes confirmed transactions from mempool and records them as confirmed."""
 
         for t in confirmed_txs:
             if t["type"] == "regular":
+                self.confirmed_ids.add(t["tx_id"])
                 self.mempool.pop(t["tx_id"], None)
+                self.tx_leaves.pop(t["tx_id"], None)
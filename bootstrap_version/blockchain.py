@@ -33,11 +33,13 @@ class Blockchain:
 
     def __init__(self):
         self.chain: list[BlockType] = []
+        self.hashes: list[str] = []  # hash of each block in self.chain, same order
         self.transactions: list[TransactionType] = []
         self.nodes = set([])
 
         initial_block = self.build_block(nonce=1, previous_block_hash="0")
         self.chain.append(initial_block)
+        self.hashes.append(self.hash_block(initial_block))
         self.transactions = []
 
     def build_block(self, nonce: int, previous_block_hash: str) -> BlockType:
@@ -47,7 +49,7 @@ class Blockchain:
             'timestamp': str(datetime.datetime.now()),
             'nonce': nonce,
             'previous_hash': previous_block_hash,
-            'transactions': self.transactions,
+            'transactions': list(self.transactions),
         }
 
         return block
@@ -61,52 +63,62 @@ class Blockchain:
     def mine_block(self) -> BlockType:
         """Mine block."""
 
-        previous_block = self.get_latest_block()
-        previous_block_hash = self.hash_block(previous_block)
+        previous_block_hash = self.hashes[-1]
 
         new_block: BlockType = self.build_block(nonce=1, previous_block_hash=previous_block_hash)
+
+        # Only nonce changes between attempts, so we hash everything else once and copy that state.
+        midstate = hashlib.sha256(self.encode_block_without_nonce(new_block))
+        nonce = new_block['nonce']
         while True:
-            new_block_hash = self.hash_block(new_block)
-            if new_block_hash.startswith('0000'):
+            new_block_hash = midstate.copy()
+            new_block_hash.update(nonce.to_bytes(8, 'big'))
+            if new_block_hash.hexdigest().startswith('0000'):
                 break
 
-            new_block['nonce'] += 1
+            nonce += 1
+
+        new_block['nonce'] = nonce
 
         self.chain.append(new_block)
+        self.hashes.append(new_block_hash.hexdigest())
         self.transactions = []
 
         return new_block
 
+    def encode_block_without_nonce(self, block: BlockType) -> bytes:
+        """Encodes block resource, leaving out the nonce."""
+
+        return json.dumps({k: v for k, v in block.items() if k != 'nonce'}, sort_keys = True).encode()
+
     def hash_block(self, block: BlockType) -> str:
-        """Hashes block resource."""
+        """Hashes block resource. Nonce goes last, as 8-byte big-endian, after the encoded block."""
 
-        encoded_block = json.dumps(block, sort_keys = True).encode()
+        encoded_block = self.encode_block_without_nonce(block) + block['nonce'].to_bytes(8, 'big')
 
         return hashlib.sha256(encoded_block).hexdigest()
 
     def is_chain_valid(self, chain: list[BlockType] | None = None) -> bool:
         """Checking full chain validity."""
 
-        chain = chain or self.chain
-        previous_index = 0
-        current_index = 1
+        # Our own chain's hashes are already cached; other chains get each block hashed once.
+        if chain:
+            return self.links_valid(chain, [self.hash_block(block) for block in chain])
 
-        while current_index < len(chain):
-            previous_block: BlockType = chain[previous_index]
-            current_block: BlockType = chain[current_index]
+        return self.links_valid(self.chain, self.hashes)
 
+    def links_valid(self, chain: list[BlockType], hashes: list[str]) -> bool:
+        """Checking chain validity, given hashes of its blocks."""
+
+        for previous_hash, current_block, current_hash in zip(hashes, chain[1:], hashes[1:]):
             # Checking if current block correctly points to previous block's hash.
-            if current_block['previous_hash'] != self.hash_block(previous_block):
+            if current_block['previous_hash'] != previous_hash:
                 return False
 
-
             # Checking if current block's hash is valid.
-            if not self.hash_block(current_block).startswith('0000'):
+            if not current_hash.startswith('0000'):
                 return False
 
-            previous_index = current_index
-            current_index += 1
-
         return True
 
     def add_transaction(self, sender, receiver, amount):
@@ -128,6 +140,7 @@ class Blockchain:
         """Tracks whole network and updates chain."""
         network = self.nodes
         longest_chain = None
+        longest_chain_hashes = None
         max_length = len(self.chain)
 
         for node in network:
@@ -136,12 +149,18 @@ class Blockchain:
                 length = response.json()['length']
                 chain = response.json()['chain']
 
-                if length > max_length and self.is_chain_valid(chain):
+                if length <= max_length:
+                    continue
+
+                hashes = [self.hash_block(block) for block in chain]
+                if self.links_valid(chain, hashes):
                     longest_chain = chain
+                    longest_chain_hashes = hashes
                     max_length = length
 
         if longest_chain:
             self.chain = longest_chain
+            self.hashes = longest_chain_hashes
             return True
 
         return False
@@ -1,11 +1,14 @@
 import socket
+import struct
 import threading
 import json
 import uuid
+from collections import OrderedDict
 from enum import Enum
 from typing import Any, cast
 from data_types import TransactionType, BlockType
 from blockchain_core import Blockchain
+import wire
 
 
 class CommandEnum(Enum):
@@ -17,6 +20,14 @@ class CommandEnum(Enum):
 
 RENDEZVOUS = ('127.0.0.1', 55555)
 
+# Messages are split into datagrams, so FULL_CHAIN isn't capped by UDP's ~64KB. Each datagram
+# carries the full message length and its own offset, so a lost one only drops that message.
+CHUNK_HEADER = struct.Struct('<II')
+MAX_CHUNK = 60000
+
+TX_TTL = 4  # hops a gossiped transaction travels
+SEEN_TX_CAPACITY = 1 << 16  # most recent tx ids remembered for gossip dedup
+
 
 class Node:
     """
@@ -31,9 +42,17 @@ class Node:
         self.port = self.sock.getsockname()[1]
         self.address = str(uuid.uuid4()).replace('-', '')
         self.peers: list[tuple[str, int]] = []
-        self.seen_tx_ids: set[str] = set()
-
-        print(f"My address: {self.address}  UDP:{self.port}")
+        self.seen_tx_ids: OrderedDict[str, None] = OrderedDict()  # bounded LRU, see _mark_seen
+        self._partial: dict[tuple[str, int], bytearray] = {}  # incomplete incoming messages, per peer
+        self._send_lock = threading.Lock()  # keeps datagrams of one message together
+        self._handlers = {
+            "new_transaction": self._on_new_transaction,
+            "new_block": self._on_new_block,
+            "REQ_CHAIN": self._on_req_chain,
+            "FULL_CHAIN": self._on_full_chain,
+        }
+
+        print(f"My address: {self.address}  UDP:{self.port}  Mining: {self.blockchain.mining_backend()}")
 
     def connect(self):
         """Registers/connects current node to rendezvous. sets separate thread for main listener."""
@@ -41,17 +60,46 @@ class Node:
         threading.Thread(target=self.listen, daemon=True).start()
         self.repl()
 
+    def _mark_seen(self, tx_id: str) -> None:
+        """Remembers tx id for dedup, forgetting the least recently seen one over SEEN_TX_CAPACITY."""
+        self.seen_tx_ids[tx_id] = None
+        self.seen_tx_ids.move_to_end(tx_id)
+        if len(self.seen_tx_ids) > SEEN_TX_CAPACITY:
+            self.seen_tx_ids.popitem(last=False)
+
+    def _send_raw(self, raw: bytes, peer: tuple[str, int]) -> None:
+        """Sends encoded message to peer, split into as many datagrams as needed."""
+        with self._send_lock:
+            for offset in range(0, len(raw), MAX_CHUNK):
+                self.sock.sendto(CHUNK_HEADER.pack(len(raw), offset) + raw[offset:offset + MAX_CHUNK], peer)
+
     def _send(self, msg: dict[str, Any], peer: tuple[str, int]) -> None:
         """Sends message to specific peer."""
-        self.sock.sendto(json.dumps(msg).encode(), peer)
+        self._send_raw(wire.encode(msg), peer)
 
     def _broadcast(self, msg: dict[str, Any], except_peer: tuple[str, int] | None = None) -> None:
         """Broadcasts message all over the P2P network."""
-        raw = json.dumps(msg).encode()
+        raw = wire.encode(msg)
         for peer in self.peers:
             if except_peer and peer == except_peer:
                 continue
-            self.sock.sendto(raw, peer)
+            self._send_raw(raw, peer)
+
+    def _reassemble(self, data: bytes, addr: tuple[str, int]) -> bytes | None:
+        """Collects datagrams from a peer; returns the message once all of its bytes arrived."""
+        size, offset = CHUNK_HEADER.unpack_from(data)
+        buf = self._partial.pop(addr, None)
+        if offset == 0:
+            buf = bytearray()
+        elif buf is None or len(buf) != offset:
+            return None  # a datagram got lost - drop the rest of this message
+
+        buf += data[CHUNK_HEADER.size:]
+        if len(buf) < size:
+            self._partial[addr] = buf
+            return None
+
+        return bytes(buf)
 
     def _request_full_chain_from(self, peer: tuple[str, int]) -> None:
         """Requests full chain from specific peer of P2P network."""
@@ -62,63 +110,81 @@ class Node:
         if self.peers:
             self._request_full_chain_from(self.peers[0])
 
+    def _on_peers(self, msg: str) -> None:
+        """Handles peers list from rendezvous."""
+        _, *peer_addresses = msg.split()
+
+        new_peers = []
+        for s in peer_addresses:
+            ip, port = s.split(":")
+            peer = (ip, int(port))
+            if peer != ("127.0.0.1", self.port) and peer not in self.peers:
+                new_peers.append(peer)
+
+        if new_peers:
+            self.peers.extend(new_peers)
+            print("Updated peers:", self.peers)
+            self._startup_sync()
+
+    def _on_new_transaction(self, payload: dict[str, Any], addr: tuple[str, int]) -> None:
+        """Handles gossiped transaction: adds it to mempool and passes it on while ttl lasts."""
+        tx = cast(TransactionType, payload["tx"])
+        tx_id = tx["tx_id"]
+        ttl = min(int(payload.get("ttl", TX_TTL)), TX_TTL)
+
+        if not tx_id:
+            return
+
+        if tx_id in self.seen_tx_ids:
+            self.seen_tx_ids.move_to_end(tx_id)  # still circulating - keep it away from eviction
+            return
+
+        self._mark_seen(tx_id)
+        added, tx = self.blockchain.add_transaction(tx)
+        if not added:
+            return  # rejected txs aren't passed on (they may not even be encodable)
+
+        print(f"💸 TX added to mempool: {tx}")
+        if ttl > 0:
+            self._broadcast({"type": "new_transaction", "tx": tx, "ttl": ttl - 1}, except_peer=addr)
+
+    def _on_new_block(self, payload: dict[str, Any], addr: tuple[str, int]) -> None:
+        """Handles gossiped block: extends our tip, or asks sender for its full chain."""
+        block = cast(BlockType, payload["block"])
+        if self.blockchain.validate_and_add_block(block):
+            print(f"\n📦 Added block {block['index']} (txs={len(block['transactions'])}) || {block}")
+        else:
+            self._request_full_chain_from(addr)
+
+    def _on_req_chain(self, payload: dict[str, Any], addr: tuple[str, int]) -> None:
+        """Handles full chain request."""
+        self._send({"type": "FULL_CHAIN", "chain": self.blockchain.chain}, addr)
+
+    def _on_full_chain(self, payload: dict[str, Any], addr: tuple[str, int]) -> None:
+        """Handles full chain sent by peer: adopts it if it's longer and valid."""
+        remote = payload["chain"]
+        if self.blockchain.replace_chain(remote):
+            print(f"\n🔁 Chain replaced. Height={len(self.blockchain.chain)}")
+
     def listen(self):
         """Main listener method. Usage: usually, all the nodes are processing its listener in a separate thread."""
         while True:
             data, addr = self.sock.recvfrom(65536)
-            msg = data.decode()
-
-            # peers list from rendezvous
-            if msg.startswith("PEERS"):
-                _, *peer_addresses = msg.split()
-
-                new_peers = []
-                for s in peer_addresses:
-                    ip, port = s.split(":")
-                    peer = (ip, int(port))
-                    if peer != ("127.0.0.1", self.port) and peer not in self.peers:
-                        new_peers.append(peer)
-
-                if new_peers:
-                    self.peers.extend(new_peers)
-                    print("Updated peers:", self.peers)
-                    self._startup_sync()
 
+            # peers list from rendezvous - plain text, not chunked
+            if data.startswith(b"PEERS"):
+                self._on_peers(data.decode())
                 continue
 
             try:
-                payload = json.loads(msg)
-
-                if payload["type"] == "new_transaction":
-                    tx = cast(TransactionType, payload["tx"])
-                    tx_id = tx["tx_id"]
-                    ttl = int(payload.get("ttl", 4))
-
-                    if not tx_id or tx_id in self.seen_tx_ids:
-                        continue
-
-                    self.seen_tx_ids.add(tx_id)
-                    added, _ = self.blockchain.add_transaction(tx)
-                    if added:
-                        print(f"💸 TX added to mempool: {tx}")
-
-                    if ttl > 0:
-                        self._broadcast({"type": "new_transaction", "tx": tx, "ttl": ttl - 1}, except_peer=addr)
-
-                elif payload["type"] == "new_block":
-                    block = cast(BlockType, payload["block"])
-                    if self.blockchain.validate_and_add_block(block):
-                        print(f"\n📦 Added block {block['index']} (txs={len(block['transactions'])}) || {block}")
-                    else:
-                        self._request_full_chain_from(addr)
-
-                elif payload["type"] == "REQ_CHAIN":
-                    self._send({"type": "FULL_CHAIN", "chain": self.blockchain.chain}, addr)
+                raw = self._reassemble(data, addr)
+                if raw is None:
+                    continue
 
-                elif payload["type"] == "FULL_CHAIN":
-                    remote = payload["chain"]
-                    if self.blockchain.replace_chain(remote):
-                        print(f"\n🔁 Chain replaced. Height={len(self.blockchain.chain)}")
+                payload = wire.decode(raw)
+                handler = self._handlers.get(payload["type"])
+                if handler:
+                    handler(payload, addr)
 
             except Exception as e:
                 print("Decode error:", e)
@@ -130,19 +196,20 @@ class Node:
             if not cmd:
                 continue
             head, *rest = cmd.split()
+            command = head.upper()
 
-            if head.upper() == CommandEnum.CHAIN.value:
+            if command == CommandEnum.CHAIN.value:
                 print(json.dumps(self.blockchain.chain, indent=2))
 
-            elif head.upper() == CommandEnum.MEMPOOL.value:
+            elif command == CommandEnum.MEMPOOL.value:
                 print(json.dumps(list(self.blockchain.mempool.values()), indent=2))
 
-            elif head.upper() == CommandEnum.MINE.value:
+            elif command == CommandEnum.MINE.value:
                 blk = self.blockchain.mine_block(self.address)
                 print(f"⛏️  Mined block {blk['index']} (txs={len(blk['transactions'])})")
                 self._broadcast({"type": "new_block", "block": blk})
 
-            elif head.upper() == CommandEnum.TX.value:
+            elif command == CommandEnum.TX.value:
                 # TX <receiver> <amount>  (sender is me)
                 if len(rest) != 2:
                     print("Usage: TX <receiver> <amount>")
@@ -159,8 +226,8 @@ class Node:
                 added, _ = self.blockchain.add_transaction(tx)
 
                 if added:
-                    self.seen_tx_ids.add(tx["tx_id"])
-                    self._broadcast({"type": "new_transaction", "tx": tx, "ttl": 4})
+                    self._mark_seen(tx["tx_id"])
+                    self._broadcast({"type": "new_transaction", "tx": tx, "ttl": TX_TTL})
                     print(f"✅ TX accepted & broadcast: {tx}")
                 else:
                     print("TX rejected or duplicate")
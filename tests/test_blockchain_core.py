@@ -0,0 +1,23 @@
+import unittest
+from unittest import mock
+
+from blockchain_core import Blockchain
+
+
+class MineBlockTest(unittest.TestCase):
+
+    def test_timestamp_is_captured_once_before_nonce_search(self):
+        frozen = "2026-01-01T12:00:00.000001"
+        blockchain = Blockchain(workers=1)
+
+        with mock.patch("blockchain_core.datetime") as datetime_mock:
+            datetime_mock.datetime.now.return_value.isoformat.return_value = frozen
+            block = blockchain.mine_block("miner")
+
+        datetime_mock.datetime.now.assert_called_once()
+        self.assertEqual(block["timestamp"], frozen)
+        self.assertTrue(blockchain.is_chain_valid())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+"""
+Wire format of node-to-node messages.
+
+Gossip messages (new_transaction, new_block) are sent on every hop, so they use a compact binary
+layout; anything else (REQ_CHAIN, FULL_CHAIN) stays JSON. The first byte tells them apart - JSON
+messages always start with '{'.
+"""
+import json
+import struct
+from typing import Any
+from data_types import BlockType, TransactionType
+
+
+NEW_TRANSACTION = 1
+NEW_BLOCK = 2
+
+TX_TYPES = ("regular", "coinbase")
+_TX_KEYS = TransactionType.__annotations__.keys()
+_HEX_DIGITS = frozenset("0123456789abcdef")
+
+_TX_MSG = struct.Struct("<BB")  # kind, ttl
+_BLOCK_MSG = struct.Struct("<BIQ32sI")  # kind, index, nonce, previous hash, transactions count
+_TX = struct.Struct("<Bd")  # tx type, amount
+_STR_LEN = struct.Struct("<H")
+
+
+def _pack_str(s: str) -> bytes:
+    """Packs string, prefixed with its length."""
+    raw = s.encode()
+    return _STR_LEN.pack(len(raw)) + raw
+
+
+def _unpack_str(raw: bytes, offset: int) -> tuple[str, int]:
+    """Unpacks length-prefixed string at offset. Returns (string, offset right after it)."""
+    (size,) = _STR_LEN.unpack_from(raw, offset)
+    offset += _STR_LEN.size
+    return raw[offset:offset + size].decode(), offset + size
+
+
+def _pack_tx(tx: TransactionType) -> bytes:
+    """Packs single transaction."""
+    return (
+        _TX.pack(TX_TYPES.index(tx["type"]), float(tx["amount"]))
+        + _pack_str(tx["tx_id"])
+        + _pack_str(tx["sender"])
+        + _pack_str(tx["receiver"])
+    )
+
+
+def _unpack_tx(raw: bytes, offset: int) -> tuple[TransactionType, int]:
+    """Unpacks transaction at offset. Returns (transaction, offset right after it)."""
+    tx_type, amount = _TX.unpack_from(raw, offset)
+    tx_id, offset = _unpack_str(raw, offset + _TX.size)
+    sender, offset = _unpack_str(raw, offset)
+    receiver, offset = _unpack_str(raw, offset)
+    tx: TransactionType = {
+        "tx_id": tx_id,
+        "sender": sender,
+        "receiver": receiver,
+        "amount": amount,
+        "type": TX_TYPES[tx_type],
+    }
+    return tx, offset
+
+
+def _is_packable(block: BlockType) -> bool:
+    """
+    Checks that the binary layout represents block exactly - decoding must give back a block with
+    the same hash, otherwise peers couldn't validate it.
+    """
+    prev = block["previous_hash"]
+    if not isinstance(prev, str) or len(prev) != 64 or not _HEX_DIGITS.issuperset(prev):
+        return False
+
+    return all(
+        isinstance(tx, dict)
+        and tx.keys() == _TX_KEYS
+        and type(tx["amount"]) is float
+        and tx["type"] in TX_TYPES
+        and all(isinstance(tx[key], str) for key in ("tx_id", "sender", "receiver"))
+        for tx in block["transactions"]
+    )
+
+
+def _pack_block_msg(block: BlockType) -> bytes:
+    """Packs new_block message."""
+    return b"".join([
+        _BLOCK_MSG.pack(
+            NEW_BLOCK,
+            block["index"],
+            block["nonce"],
+            bytes.fromhex(block["previous_hash"]),
+            len(block["transactions"]),
+        ),
+        _pack_str(block["timestamp"]),
+        *(_pack_tx(tx) for tx in block["transactions"]),
+    ])
+
+
+def encode(msg: dict[str, Any]) -> bytes:
+    """Encodes message for the wire."""
+    if msg["type"] == "new_transaction":
+        return _TX_MSG.pack(NEW_TRANSACTION, msg["ttl"]) + _pack_tx(msg["tx"])
+
+    # Blocks the binary layout can't carry as-is (e.g. an int amount) go as JSON instead.
+    if msg["type"] == "new_block" and _is_packable(msg["block"]):
+        return _pack_block_msg(msg["block"])
+
+    return json.dumps(msg).encode()
+
+
+def decode(raw: bytes) -> dict[str, Any]:
+    """Decodes message received from the wire."""
+    if raw[0] == NEW_TRANSACTION:
+        _, ttl = _TX_MSG.unpack_from(raw)
+        tx, _ = _unpack_tx(raw, _TX_MSG.size)
+        return {"type": "new_transaction", "tx": tx, "ttl": ttl}
+
+    if raw[0] == NEW_BLOCK:
+        _, index, nonce, previous_hash, tx_count = _BLOCK_MSG.unpack_from(raw)
+        timestamp, offset = _unpack_str(raw, _BLOCK_MSG.size)
+        txs = []
+        for _ in range(tx_count):
+            tx, offset = _unpack_tx(raw, offset)
+            txs.append(tx)
+
+        block: BlockType = {
+            "index": index,
+            "timestamp": timestamp,
+            "nonce": nonce,
+            "previous_hash": previous_hash.hex(),
+            "transactions": txs,
+        }
+        return {"type": "new_block", "block": block}
+
+    return json.loads(raw)